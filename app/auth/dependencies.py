@@ -1,7 +1,9 @@
 import uuid
-from fastapi import Depends, HTTPException, status
+from typing import Union
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models.user import User
@@ -10,33 +12,51 @@ from app.schemas.user import UserResponse
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> UserResponse:
-    """Dependency to get current user from JWT token."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+async def get_token_identifier(token: str = Depends(oauth2_scheme)) -> Union[uuid.UUID, str]:
+    """Dependency to get the user identifier (UUID or username) from a JWT token."""
     identifier = User.verify_token(token)
     if not identifier:
-        raise credentials_exception
+        raise _credentials_exception()
+    return identifier
 
-    if isinstance(identifier, uuid.UUID):
-        user = db.query(User).filter(User.id == identifier).first()
-    else:
-        user = db.query(User).filter(User.username == identifier).first()
 
-    if user is None:
-        raise credentials_exception
+async def get_current_user(
+    request: Request,
+    identifier: Union[uuid.UUID, str] = Depends(get_token_identifier),
+    db: AsyncSession = Depends(get_db)
+) -> UserResponse:
+    """
+    Dependency to get current user from the token identifier.
+
+    The loaded User is kept on `request.state` so later lookups for the same
+    identifier within the request reuse it instead of querying again.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None or getattr(request.state, "user_identifier", None) != identifier:
+        if isinstance(identifier, uuid.UUID):
+            # Primary-key lookup: served from the identity map when already loaded
+            user = await db.get(User, identifier)
+        else:
+            user = await db.scalar(select(User).where(User.username == identifier))
+
+        if user is None:
+            raise _credentials_exception()
+
+        request.state.user = user
+        request.state.user_identifier = identifier
 
     return UserResponse.model_validate(user)
 
 
-def get_current_active_user(
+async def get_current_active_user(
     current_user: UserResponse = Depends(get_current_user)
 ) -> UserResponse:
     """Dependency to get current active user."""
@@ -46,4 +66,3 @@ def get_current_active_user(
             detail="Inactive user",
         )
     return current_user
-
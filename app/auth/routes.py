@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.models.user import User
@@ -8,17 +8,17 @@ from app.schemas.user import UserCreate, UserLogin, Token
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 @router.post("/register", response_model=Token)
-def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        new_user = User.register(db, user_data.dict())
-        token = User.authenticate(db, new_user.username, user_data.password)
+        new_user = await User.register(db, user_data)
+        token = await User.authenticate(db, new_user.username, user_data.password)
         return token
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/login", response_model=Token)
-def login(credentials: UserLogin, db: Session = Depends(get_db)):
-    token = User.authenticate(db, credentials.username, credentials.password)
+async def login(credentials: UserLogin, db: AsyncSession = Depends(get_db)):
+    token = await User.authenticate(db, credentials.username, credentials.password)
     if not token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,6 +1,8 @@
 # app/database.py
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -17,8 +19,9 @@ def get_engine(database_url: str = settings.DATABASE_URL):
         Engine: A new SQLAlchemy Engine instance.
     """
     try:
-        # Create an engine instance with echo=True to log SQL queries (useful for learning)
-        engine = create_engine(database_url, echo=True)
+        # Create an engine instance with echo=True to log SQL queries (useful for learning).
+        # query_cache_size sizes the compiled-statement cache shared by select() queries.
+        engine = create_engine(database_url, echo=True, query_cache_size=1200)
         return engine
     except SQLAlchemyError as e:
         print(f"Error creating engine: {e}")
@@ -40,25 +43,78 @@ def get_sessionmaker(engine):
         bind=engine        # Bind the sessionmaker to the provided engine
     )
 
-# Initialize engine and SessionLocal using the factory functions
-engine = get_engine()
-SessionLocal = get_sessionmaker(engine)
+def get_async_database_url(database_url: str = settings.DATABASE_URL) -> str:
+    """
+    Return the given PostgreSQL URL rewritten to use the asyncpg driver.
+
+    Args:
+        database_url (str): The database connection URL (any postgresql driver).
+
+    Returns:
+        str: The same URL with a `postgresql+asyncpg` driver name.
+    """
+    url = make_url(database_url).set(drivername="postgresql+asyncpg")
+    return url.render_as_string(hide_password=False)
+
+def get_async_engine(database_url: str = settings.DATABASE_URL):
+    """
+    Create and return a new SQLAlchemy AsyncEngine backed by asyncpg.
+
+    Args:
+        database_url (str): The database connection URL.
+
+    Returns:
+        AsyncEngine: A new SQLAlchemy AsyncEngine instance.
+    """
+    try:
+        return create_async_engine(
+            get_async_database_url(database_url),
+            echo=True,
+            pool_size=20,            # Fixed-size pool: one asyncpg connection per concurrent query
+            max_overflow=0,
+            query_cache_size=1200,   # Compiled-statement cache, as for the sync engine
+            # asyncpg keeps this many server-side prepared statements per connection,
+            # so repeated queries skip the parse/plan step on the server
+            connect_args={"prepared_statement_cache_size": 500},
+        )
+    except SQLAlchemyError as e:
+        print(f"Error creating async engine: {e}")
+        raise
+
+def get_async_sessionmaker(engine):
+    """
+    Create and return a new async_sessionmaker.
+
+    Args:
+        engine (AsyncEngine): The SQLAlchemy AsyncEngine to bind the sessionmaker to.
+
+    Returns:
+        async_sessionmaker: A configured AsyncSession factory.
+    """
+    return async_sessionmaker(
+        autoflush=False,          # Match the sync sessions: flush explicitly
+        expire_on_commit=False,   # Avoid implicit (blocking) reloads of attributes after commit
+        bind=engine
+    )
+
+# Initialize the async engine and session factory used by request handlers.
+# The sync engine is only needed for schema management, so app.database_init
+# builds it; app workers never load psycopg2.
+async_engine = get_async_engine()
+AsyncSessionLocal = get_async_sessionmaker(async_engine)
 
 # Base declarative class that our models will inherit from
 Base = declarative_base()
 
-def get_db():
+async def get_db():
     """
-    Dependency function that provides a database session.
+    Dependency function that provides an async database session.
 
     This function can be used with FastAPI's dependency injection system
     to provide a database session to your route handlers.
 
     Yields:
-        Session: A SQLAlchemy Session instance.
+        AsyncSession: A SQLAlchemy AsyncSession instance.
     """
-    db = SessionLocal()  # Create a new database session
-    try:
-        yield db  # Provide the session to the caller
-    finally:
-        db.close()  # Ensure the session is closed after use
+    async with AsyncSessionLocal() as db:  # Session is closed when the block exits
+        yield db
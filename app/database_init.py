@@ -1,5 +1,7 @@
-from app.database import engine
-from app.models.user import Base
+from app.database import Base, get_engine
+from app.models import user  # noqa: F401  (registers the users table on Base.metadata)
+
+engine = get_engine()
 
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -1,35 +1,104 @@
-import os
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Union
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Deque, Optional, Tuple, Union
 
-from sqlalchemy import Column, String, DateTime, Boolean
+import anyio
+from sqlalchemy import Column, String, DateTime, Boolean, FetchedValue, case, func, select, update
 from sqlalchemy.dialects.postgresql import UUID as PG_UUID
-from sqlalchemy.orm import declarative_base, Session
-
-from passlib.context import CryptContext
-from jose import JWTError, jwt
-from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.auth import hashing
+from app.auth.tokens import decode_token, encode_token, is_well_formed
+from app.database import Base
 from app.schemas.user import UserCreate, UserResponse, Token
 
-# SQLAlchemy base
-Base = declarative_base()
-
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Config (use env vars in production)
-SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-key")
-ALGORITHM = "HS256"
+# Token config (signing key and algorithm live in app.auth.tokens)
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
+ACCESS_TOKEN_EXPIRE_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+TOKEN_CACHE_SIZE = 4096
+
+
+class _InvalidToken(Exception):
+    """Raised by `_decode_token` instead of returning, so lru_cache never stores failures."""
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _decode_token(token: str) -> Tuple[Union[uuid.UUID, str], Optional[int]]:
+    """
+    Decode and verify a token once, caching `(identifier, exp)` by token string.
+    Expiry is re-checked by the caller, so a cached entry stops being honoured
+    as soon as its `exp` passes. Invalid tokens raise `_InvalidToken` and are
+    not cached, so forged tokens can't evict real sessions from the cache.
+    """
+    payload = decode_token(token)
+    if payload is None:
+        raise _InvalidToken
+    sub = payload.get("sub")
+    if not sub or not isinstance(sub, str):
+        raise _InvalidToken
+    try:
+        identifier = uuid.UUID(sub)
+    except (ValueError, TypeError):
+        identifier = sub
+    return identifier, payload.get("exp")
+
+
+def _expiry_timestamp(expires_delta: Optional[timedelta] = None) -> int:
+    """Unix `exp` for a token minted now; JWT wants an int, so skip datetime math."""
+    lifetime = int(expires_delta.total_seconds()) if expires_delta else ACCESS_TOKEN_EXPIRE_SECONDS
+    return int(time.time()) + lifetime
+
+
+# Successful logins waiting to be written to users.last_login in one batch
+_pending_logins: Deque[Tuple[uuid.UUID, datetime]] = deque()
+_pending_logins_lock = threading.Lock()
+
+
+def record_login(user_id: uuid.UUID) -> None:
+    """Queue a last_login update for the next `flush_last_logins` call."""
+    with _pending_logins_lock:
+        _pending_logins.append((user_id, datetime.now(timezone.utc)))
+
+
+async def flush_last_logins(db: AsyncSession) -> int:
+    """
+    Write all queued last_login updates with a single UPDATE ... CASE statement.
+
+    Returns the number of rows updated. If the write fails or is cancelled the
+    updates are put back on the queue so the next flush retries them.
+    """
+    with _pending_logins_lock:
+        if not _pending_logins:
+            return 0
+        pending = dict(_pending_logins)  # later logins for the same user win
+        _pending_logins.clear()
+
+    try:
+        result = await db.execute(
+            update(User)
+            .where(User.id.in_(pending))
+            .values(last_login=case(pending, value=User.id)),
+            execution_options={"synchronize_session": False},
+        )
+        await db.commit()
+    except BaseException:
+        # Re-queue first, so a cancelled flush (worker shutdown) or a failing
+        # rollback can't drop the batch; rewriting the same values is harmless.
+        with _pending_logins_lock:
+            _pending_logins.extendleft(reversed(pending.items()))
+        await db.rollback()
+        raise
+    return result.rowcount
 
 class User(Base):
     __tablename__ = "users"
 
     id = Column(PG_UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    username = Column(String(50), unique=True, nullable=False)
+    username = Column(String(50), unique=True, index=True, nullable=False)
     email = Column(String(120), unique=True, nullable=False)
 
     first_name = Column(String(50), nullable=True)
@@ -38,9 +107,19 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_verified = Column(Boolean, default=False, nullable=False)
-    last_login = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    last_login = Column(DateTime(timezone=True), nullable=True)
+    # Timestamps come from the database clock (same for every worker); with
+    # eager_defaults they are returned from the INSERT/UPDATE rather than lazily reloaded
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        server_onupdate=FetchedValue(),
+        nullable=False,
+    )
+
+    __mapper_args__ = {"eager_defaults": True}
 
     def __init__(self, **kwargs):
         """Allow passing `password` directly into constructor for tests."""
@@ -71,14 +150,17 @@ class User(Base):
 
     @password.setter
     def password(self, plaintext: str):
-        self.password_hash = self.hash_password(plaintext)
+        # Synchronous on purpose: used by the constructor, outside the request path
+        self.password_hash = hashing.hash_password(plaintext)
 
     @staticmethod
-    def hash_password(password: str) -> str:
-        return pwd_context.hash(password)
+    async def hash_password(password: str) -> str:
+        """Hash in a worker thread so bcrypt doesn't block the event loop."""
+        return await anyio.to_thread.run_sync(hashing.hash_password, password)
 
-    def verify_password(self, plain_password: str) -> bool:
-        return pwd_context.verify(plain_password, self.password_hash)
+    async def verify_password(self, plain_password: str) -> bool:
+        """Verify in a worker thread so bcrypt doesn't block the event loop."""
+        return await anyio.to_thread.run_sync(hashing.verify_password, plain_password, self.password_hash)
 
     # -------------------------
     # JWT utilities
@@ -86,18 +168,14 @@ class User(Base):
     @staticmethod
     def create_access_token_for_username(identifier: Union[str, uuid.UUID], expires_delta: Optional[timedelta] = None) -> str:
         """Create a token with either the user's UUID or username as subject."""
-        to_encode = {"sub": str(identifier)}
-        expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-        to_encode.update({"exp": expire})
-        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        return encode_token({"sub": str(identifier), "exp": _expiry_timestamp(expires_delta)})
 
     @staticmethod
     def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
         """Alias expected by tests: accepts arbitrary dict"""
         to_encode = data.copy()
-        expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-        to_encode.update({"exp": expire})
-        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        to_encode["exp"] = _expiry_timestamp(expires_delta)
+        return encode_token(to_encode)
 
     @staticmethod
     def verify_token(token: str) -> Optional[Union[uuid.UUID, str]]:
@@ -105,64 +183,63 @@ class User(Base):
         Return the UUID object if sub is a valid UUID string,
         otherwise return the raw string (e.g., username).
         """
+        if not is_well_formed(token):
+            return None
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            sub = payload.get("sub")
-            if not sub:
-                return None
-            try:
-                return uuid.UUID(sub)
-            except (ValueError, TypeError):
-                return sub
-        except JWTError:
+            identifier, exp = _decode_token(token)
+        except _InvalidToken:
+            return None
+        if exp is not None and exp <= time.time():
             return None
+        return identifier
 
     # -------------------------
     # Business logic
     # -------------------------
     @classmethod
-    def register(cls, db: Session, user_data: Dict[str, Any]) -> "User":
-        try:
-            user_create = UserCreate.model_validate(user_data)
-
-            if not user_create.password or len(user_create.password) < 6:
-                raise ValueError("Password must be at least 6 characters long")
-
-            existing = db.query(cls).filter(
-                (cls.email == user_create.email) | (cls.username == user_create.username)
-            ).first()
-            if existing:
-                raise ValueError("Username or email already exists")
-
-            new_user = cls(
-                username=user_create.username,
-                email=user_create.email,
-                first_name=user_create.first_name,
-                last_name=user_create.last_name,
-                password=user_create.password,
-            )
-
-            db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
-            return new_user
-
-        except ValidationError as e:
-            if "password" in str(e):
-                raise ValueError("Password must be at least 6 characters long")
-            raise ValueError(str(e))
+    async def register(cls, db: AsyncSession, user_create: UserCreate) -> "User":
+        """Create a user from an already-validated UserCreate payload."""
+        # Two unique-index equality probes instead of an OR across both columns
+        existing = (
+            await db.scalar(select(cls).where(cls.username == user_create.username))
+            or await db.scalar(select(cls).where(cls.email == user_create.email))
+        )
+        if existing:
+            raise ValueError("Username or email already exists")
+
+        new_user = cls(
+            username=user_create.username,
+            email=user_create.email,
+            first_name=user_create.first_name,
+            last_name=user_create.last_name,
+        )
+        new_user.password_hash = await cls.hash_password(user_create.password)
+
+        db.add(new_user)
+        await db.commit()
+        await db.refresh(new_user)
+        return new_user
 
     @classmethod
-    def authenticate(cls, db: Session, username_or_email: str, password: str) -> Optional[dict]:
-        user = db.query(cls).filter(
-            (cls.username == username_or_email) | (cls.email == username_or_email)
-        ).first()
+    async def authenticate(cls, db: AsyncSession, username_or_email: str, password: str) -> Optional[dict]:
+        # Only fetch what's needed to check the password; the full row is loaded
+        # once the password matches. Username is the common case, so probe it first.
+        credentials = select(cls.id, cls.password_hash)
+        row = (
+            (await db.execute(credentials.where(cls.username == username_or_email))).first()
+            or (await db.execute(credentials.where(cls.email == username_or_email))).first()
+        )
+        if row is None:
+            return None
+        if not await anyio.to_thread.run_sync(hashing.verify_password, password, row.password_hash):
+            return None
 
-        if not user or not user.verify_password(password):
+        user = await db.get(cls, row.id)
+        if user is None:
             return None
 
-        user.last_login = datetime.utcnow()
-        db.commit()
+        # Written in bulk by flush_last_logins rather than committing per login
+        record_login(user.id)
 
         user_response = UserResponse.model_validate(user)
         token_response = Token(
@@ -1,31 +1,67 @@
 import os
-import sys
+import asyncio
 import logging
-import uvicorn
+from contextlib import asynccontextmanager, suppress
+
+import fastapi
 from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
-from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import RequestValidationError
 from fastapi.security import OAuth2PasswordRequestForm
-from pydantic import BaseModel, Field, field_validator
-from sqlalchemy.orm import Session
-
-# --- Ensure project root is on sys.path ---
-sys.path.append(os.path.dirname(__file__))
+from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 
 # Local imports
 from app.operations import add, subtract, multiply, divide
 from app.schemas.user import UserCreate, UserResponse, Token, UserLogin
-from app import database
-from app.models.user import User
+from app.database import AsyncSessionLocal, async_engine, get_db
+from app.models.user import User, flush_last_logins
+
+# orjson-backed responses serialize UUIDs and datetimes natively in C. FastAPI
+# 0.131 deprecated ORJSONResponse because it now renders response models to JSON
+# bytes through Pydantic itself; that fast path only applies while the response
+# class is left at its default, so newer releases don't override it.
+if tuple(int(part) for part in fastapi.__version__.split(".")[:2]) < (0, 131):
+    from fastapi.responses import ORJSONResponse as JSONResponse
+    APP_RESPONSE_OPTIONS = {"default_response_class": JSONResponse}
+else:
+    from fastapi.responses import JSONResponse
+    APP_RESPONSE_OPTIONS = {}
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
-
-# Setup templates directory
+# How often queued last_login updates are written to the database (seconds)
+LAST_LOGIN_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "1.0"))
+
+async def flush_last_logins_periodically(interval: float = LAST_LOGIN_FLUSH_INTERVAL):
+    """Background task: drain the last_login queue every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                await flush_last_logins(db)
+        except Exception as e:
+            logger.error(f"last_login flush failed: {str(e)}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    flusher = asyncio.create_task(flush_last_logins_periodically())
+    try:
+        yield
+    finally:
+        flusher.cancel()
+        with suppress(asyncio.CancelledError):
+            await flusher
+        try:
+            # Write out anything queued since the last tick before the worker exits
+            async with AsyncSessionLocal() as db:
+                await flush_last_logins(db)
+        finally:
+            await async_engine.dispose()
+
+app = FastAPI(lifespan=lifespan, **APP_RESPONSE_OPTIONS)
 templates = Jinja2Templates(directory="templates")
 
 # ------------------------------
@@ -36,12 +72,6 @@ class OperationRequest(BaseModel):
     a: float = Field(..., description="The first number")
     b: float = Field(..., description="The second number")
 
-    @field_validator('a', 'b')
-    def validate_numbers(cls, value):
-        if not isinstance(value, (int, float)):
-            raise ValueError('Both a and b must be numbers.')
-        return value
-
 class OperationResponse(BaseModel):
     result: float = Field(..., description="The result of the operation")
 
@@ -59,68 +89,59 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     logger.error(f"ValidationError on {request.url.path}: {error_messages}")
     return JSONResponse(status_code=400, content={"error": error_messages})
 
+# Anything unexpected still answers in the app's {"error": ...} shape rather than
+# Starlette's plain-text 500; the traceback is logged here.
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    logger.exception(f"Unhandled error on {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=500, content={"error": "Internal Server Error"})
+
 @app.get("/")
 async def read_root(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
+
+# The operation routes return plain dicts and let the response model serialize
+# them, so non-finite results (e.g. an overflowing multiply) come out as null
+# instead of failing JSON rendering. Float arithmetic itself only raises for
+# divide-by-zero; any other failure goes to unhandled_exception_handler.
+OPERATION_RESPONSES = {400: {"model": ErrorResponse}}
 
-@app.post("/add", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+@app.post("/add", response_model=OperationResponse, responses=OPERATION_RESPONSES)
 async def add_route(operation: OperationRequest):
-    try:
-        return OperationResponse(result=add(operation.a, operation.b))
-    except Exception as e:
-        logger.error(f"Add Operation Error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": add(operation.a, operation.b)}
 
-@app.post("/subtract", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+@app.post("/subtract", response_model=OperationResponse, responses=OPERATION_RESPONSES)
 async def subtract_route(operation: OperationRequest):
-    try:
-        return OperationResponse(result=subtract(operation.a, operation.b))
-    except Exception as e:
-        logger.error(f"Subtract Operation Error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": subtract(operation.a, operation.b)}
 
-@app.post("/multiply", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+@app.post("/multiply", response_model=OperationResponse, responses=OPERATION_RESPONSES)
 async def multiply_route(operation: OperationRequest):
-    try:
-        return OperationResponse(result=multiply(operation.a, operation.b))
-    except Exception as e:
-        logger.error(f"Multiply Operation Error: {str(e)}")
-        raise HTTPException(status_code=400, detail=str(e))
+    return {"result": multiply(operation.a, operation.b)}
 
-@app.post("/divide", response_model=OperationResponse, responses={400: {"model": ErrorResponse}})
+@app.post("/divide", response_model=OperationResponse, responses=OPERATION_RESPONSES)
 async def divide_route(operation: OperationRequest):
     try:
-        return OperationResponse(result=divide(operation.a, operation.b))
+        result = divide(operation.a, operation.b)
     except ValueError as e:
         logger.error(f"Divide Operation Error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        logger.error(f"Divide Operation Internal Error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Internal Server Error")
+    return {"result": result}
 
 # ------------------------------
 # User registration & login
 # ------------------------------
 
-# Dependency to get DB session
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @app.post("/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        new_user = User.register(db, user.dict())
+        new_user = await User.register(db, user)
         return UserResponse.model_validate(new_user)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    token = User.authenticate(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    token = await User.authenticate(db, form_data.username, form_data.password)
     if not token:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     return token
@@ -128,4 +149,19 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 # ------------------------------
 
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    import uvicorn
+
+    # DEBUG=1 gives a single auto-reloading worker for development; otherwise run
+    # one worker per CPU. "auto" picks uvloop + httptools (libuv event loop, C HTTP
+    # parser) wherever uvicorn[standard] installed them, and falls back to asyncio
+    # and h11 elsewhere, e.g. on Windows where uvloop doesn't exist
+    debug = os.getenv("DEBUG", "").lower() in ("1", "true", "yes")
+    uvicorn.run(
+        "main:app",
+        host="127.0.0.1",
+        port=8000,
+        loop="auto",
+        http="auto",
+        reload=debug,
+        workers=1 if debug else os.cpu_count(),
+    )
@@ -1,20 +1,23 @@
 # tests/conftest.py
 
+import os
 import subprocess
 import time
 import logging
-from typing import Generator, Dict, List
+from typing import AsyncGenerator, Generator, Dict, List
 from contextlib import contextmanager
 
 import pytest
+import pytest_asyncio
 import requests
 from faker import Faker
 from playwright.sync_api import sync_playwright, Browser, Page
 from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, sessionmaker
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 
-from app.database import Base, get_engine, get_sessionmaker
+from app.database import Base, get_engine, get_sessionmaker, get_async_engine, get_async_sessionmaker
 from app.models.user import User
 from app.config import settings
 from app.database_init import init_db, drop_db
@@ -160,6 +163,26 @@ def db_session(request) -> Generator[Session, None, None]:
         session.close()
         logger.info("db_session teardown: done.")
 
+@pytest_asyncio.fixture
+async def async_db_session(request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Provide a test-scoped async database session for code under test that awaits the DB.
+    The engine is created per test so its connections belong to the test's event loop.
+    Tables are truncated afterwards, unless --preserve-db is passed.
+    """
+    engine = get_async_engine(database_url=settings.DATABASE_URL)
+    session = get_async_sessionmaker(engine=engine)()
+    try:
+        yield session
+    finally:
+        preserve_db = request.config.getoption("--preserve-db")
+        if not preserve_db:
+            for table in reversed(Base.metadata.sorted_tables):
+                await session.execute(table.delete())
+            await session.commit()
+        await session.close()
+        await engine.dispose()
+
 # ======================================================================================
 # Test Data Fixtures
 # ======================================================================================
@@ -222,7 +245,8 @@ def fastapi_server():
         process = subprocess.Popen(
             ['python', 'main.py'],
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+            stderr=subprocess.PIPE,
+            env={**os.environ, "DEBUG": "1"},  # one worker rather than one per CPU
         )
         if not wait_for_server(server_url, timeout=30):
             raise ServerStartupError("Failed to start test server")
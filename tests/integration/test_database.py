@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.orm.session import Session
 import importlib
 import sys
@@ -53,3 +54,11 @@ def test_get_sessionmaker(mock_settings):
     engine = database.get_engine()
     SessionLocal = database.get_sessionmaker(engine)
     assert isinstance(SessionLocal, sessionmaker)
+
+def test_get_async_engine_success(mock_settings):
+    """Test that get_async_engine returns an asyncpg-backed AsyncEngine with a fixed pool."""
+    database = reload_database_module()
+    engine = database.get_async_engine()
+    assert isinstance(engine, AsyncEngine)
+    assert engine.dialect.driver == "asyncpg"
+    assert engine.sync_engine.pool.size() == 20
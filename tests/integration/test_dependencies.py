@@ -1,9 +1,9 @@
 # tests/auth/test_dependencies.py
 
 import pytest
-from unittest.mock import MagicMock, patch, ANY
-from fastapi import HTTPException, status
-from app.auth.dependencies import get_current_user, get_current_active_user
+from unittest.mock import AsyncMock, MagicMock, patch, ANY
+from fastapi import HTTPException, Request, status
+from app.auth.dependencies import get_token_identifier, get_current_user, get_current_active_user
 from app.schemas.user import UserResponse
 from app.models.user import User
 from uuid import uuid4
@@ -34,10 +34,18 @@ inactive_user = User(
     updated_at=datetime.utcnow()
 )
 
-# Fixture for mocking the database session
+# Fixture for mocking the async database session
 @pytest.fixture
 def mock_db():
-    return MagicMock()
+    db = MagicMock()
+    db.get = AsyncMock()
+    db.scalar = AsyncMock()
+    return db
+
+# Fixture for a bare request carrying its own request.state
+@pytest.fixture
+def mock_request():
+    return Request({"type": "http"})
 
 # Fixture for mocking token verification
 @pytest.fixture
@@ -46,11 +54,13 @@ def mock_verify_token():
         yield mock
 
 # Test get_current_user with valid token and existing user
-def test_get_current_user_valid_token_existing_user(mock_db, mock_verify_token):
+@pytest.mark.asyncio
+async def test_get_current_user_valid_token_existing_user(mock_request, mock_db, mock_verify_token):
     mock_verify_token.return_value = sample_user.id
-    mock_db.query.return_value.filter.return_value.first.return_value = sample_user
+    mock_db.get.return_value = sample_user
 
-    user_response = get_current_user(db=mock_db, token="validtoken")
+    identifier = await get_token_identifier(token="validtoken")
+    user_response = await get_current_user(request=mock_request, identifier=identifier, db=mock_db)
 
     assert isinstance(user_response, UserResponse)
     assert user_response.id == sample_user.id
@@ -64,60 +74,86 @@ def test_get_current_user_valid_token_existing_user(mock_db, mock_verify_token):
     assert user_response.updated_at == sample_user.updated_at
 
     mock_verify_token.assert_called_once_with("validtoken")
-    mock_db.query.assert_called_once_with(User)
-    # Use ANY to ignore the specific BinaryExpression instance
-    mock_db.query.return_value.filter.assert_called_once_with(ANY)
-    mock_db.query.return_value.filter.return_value.first.assert_called_once()
+    mock_db.get.assert_awaited_once_with(User, sample_user.id)
+    mock_db.scalar.assert_not_called()
+
+# Test get_current_user with a username-subject token
+@pytest.mark.asyncio
+async def test_get_current_user_username_identifier(mock_request, mock_db):
+    mock_db.scalar.return_value = sample_user
+
+    user_response = await get_current_user(request=mock_request, identifier=sample_user.username, db=mock_db)
+
+    assert user_response.username == sample_user.username
+    # Use ANY to ignore the specific Select instance
+    mock_db.scalar.assert_awaited_once_with(ANY)
+    mock_db.get.assert_not_called()
 
-# Test get_current_user with invalid token
-def test_get_current_user_invalid_token(mock_db, mock_verify_token):
+# Test get_token_identifier with invalid token
+@pytest.mark.asyncio
+async def test_get_token_identifier_invalid_token(mock_verify_token):
     mock_verify_token.return_value = None
 
     with pytest.raises(HTTPException) as exc_info:
-        get_current_user(db=mock_db, token="invalidtoken")
+        await get_token_identifier(token="invalidtoken")
 
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
     assert exc_info.value.detail == "Could not validate credentials"
 
     mock_verify_token.assert_called_once_with("invalidtoken")
-    mock_db.query.assert_not_called()
 
 # Test get_current_user with valid token but non-existent user
-def test_get_current_user_valid_token_nonexistent_user(mock_db, mock_verify_token):
+@pytest.mark.asyncio
+async def test_get_current_user_valid_token_nonexistent_user(mock_request, mock_db, mock_verify_token):
     mock_verify_token.return_value = sample_user.id
-    mock_db.query.return_value.filter.return_value.first.return_value = None
+    mock_db.get.return_value = None
 
     with pytest.raises(HTTPException) as exc_info:
-        get_current_user(db=mock_db, token="validtoken")
+        identifier = await get_token_identifier(token="validtoken")
+        await get_current_user(request=mock_request, identifier=identifier, db=mock_db)
 
     assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
     assert exc_info.value.detail == "Could not validate credentials"
 
     mock_verify_token.assert_called_once_with("validtoken")
-    mock_db.query.assert_called_once_with(User)
-    mock_db.query.return_value.filter.assert_called_once_with(ANY)
-    mock_db.query.return_value.filter.return_value.first.assert_called_once()
+    mock_db.get.assert_awaited_once_with(User, sample_user.id)
+
+# Test get_current_user reuses the user already loaded for this request
+@pytest.mark.asyncio
+async def test_get_current_user_cached_per_request(mock_request, mock_db):
+    mock_db.get.return_value = sample_user
+
+    first = await get_current_user(request=mock_request, identifier=sample_user.id, db=mock_db)
+    second = await get_current_user(request=mock_request, identifier=sample_user.id, db=mock_db)
+
+    assert first == second
+    assert mock_request.state.user is sample_user
+    mock_db.get.assert_awaited_once_with(User, sample_user.id)
+
+    # A fresh request does not see the previous request's user
+    await get_current_user(request=Request({"type": "http"}), identifier=sample_user.id, db=mock_db)
+    assert mock_db.get.await_count == 2
 
 # Test get_current_active_user with active user
-def test_get_current_active_user_active(mock_db, mock_verify_token):
-    mock_verify_token.return_value = sample_user.id
-    mock_db.query.return_value.filter.return_value.first.return_value = sample_user
+@pytest.mark.asyncio
+async def test_get_current_active_user_active(mock_request, mock_db):
+    mock_db.get.return_value = sample_user
 
-    current_user = get_current_user(db=mock_db, token="validtoken")
-    active_user = get_current_active_user(current_user=current_user)
+    current_user = await get_current_user(request=mock_request, identifier=sample_user.id, db=mock_db)
+    active_user = await get_current_active_user(current_user=current_user)
 
     assert isinstance(active_user, UserResponse)
     assert active_user.is_active is True
 
 # Test get_current_active_user with inactive user
-def test_get_current_active_user_inactive(mock_db, mock_verify_token):
-    mock_verify_token.return_value = inactive_user.id
-    mock_db.query.return_value.filter.return_value.first.return_value = inactive_user
+@pytest.mark.asyncio
+async def test_get_current_active_user_inactive(mock_request, mock_db):
+    mock_db.get.return_value = inactive_user
 
-    current_user = get_current_user(db=mock_db, token="validtoken")
+    current_user = await get_current_user(request=mock_request, identifier=inactive_user.id, db=mock_db)
 
     with pytest.raises(HTTPException) as exc_info:
-        get_current_active_user(current_user=current_user)
+        await get_current_active_user(current_user=current_user)
 
     assert exc_info.value.status_code == status.HTTP_400_BAD_REQUEST
     assert exc_info.value.detail == "Inactive user"
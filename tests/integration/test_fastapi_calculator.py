@@ -2,6 +2,7 @@
 
 import pytest  # Import the pytest framework for writing and running tests
 from fastapi.testclient import TestClient  # Import TestClient for simulating API requests
+import main  # Imported as a module so tests can patch the operations used by the routes
 from main import app  # Import the FastAPI app instance from your main application file
 
 # ---------------------------------------------
@@ -152,3 +153,99 @@ def test_divide_by_zero_api(client):
     # Assert that the 'error' field contains the correct error message
     assert "Cannot divide by zero!" in response.json()['error'], \
         f"Expected error message 'Cannot divide by zero!', got '{response.json()['error']}'"
+
+# ---------------------------------------------
+# Test Function: test_multiply_overflow_api
+# ---------------------------------------------
+
+def test_multiply_overflow_api(client):
+    """
+    Test the Multiplication API Endpoint with an Overflowing Result.
+
+    This test verifies that a valid request whose result overflows to infinity
+    still gets a JSON response instead of a server error.
+
+    Steps:
+    1. Send a POST request to the `/multiply` endpoint with JSON data `{'a': 1e308, 'b': 10}`.
+    2. Assert that the response status code is `200 OK`.
+    3. Assert that the non-finite result is serialized as `null`.
+    """
+    response = client.post('/multiply', json={'a': 1e308, 'b': 10})
+
+    # Assert that the response status code is 200 (OK)
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+
+    # Assert that infinity is rendered as JSON null
+    assert response.json() == {'result': None}, f"Expected null result, got {response.text}"
+
+# ---------------------------------------------
+# Test Function: test_divide_overflow_api
+# ---------------------------------------------
+
+def test_divide_overflow_api(client):
+    """
+    Test the Division API Endpoint with an Overflowing Result.
+
+    This test verifies that an overflowing quotient is a successful response,
+    not reported as a divide error.
+
+    Steps:
+    1. Send a POST request to the `/divide` endpoint with JSON data `{'a': 1e308, 'b': 1e-10}`.
+    2. Assert that the response status code is `200 OK` and the result is `null`.
+    """
+    response = client.post('/divide', json={'a': 1e308, 'b': 1e-10})
+
+    # Assert that the response status code is 200 (OK)
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+
+    # Assert that infinity is rendered as JSON null
+    assert response.json() == {'result': None}, f"Expected null result, got {response.text}"
+
+# ---------------------------------------------
+# Test Function: test_unexpected_error_returns_json
+# ---------------------------------------------
+
+def test_unexpected_error_returns_json(monkeypatch):
+    """
+    Test that an Unexpected Server Error Keeps the JSON Error Shape.
+
+    Steps:
+    1. Patch the `multiply` operation used by the route to raise.
+    2. Send a POST request to the `/multiply` endpoint.
+    3. Assert a `500` status with an 'error' field in the JSON response.
+    """
+    def broken_multiply(a, b):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "multiply", broken_multiply)
+    with TestClient(app, raise_server_exceptions=False) as client:
+        response = client.post('/multiply', json={'a': 2, 'b': 3})
+
+    # Assert that the response status code is 500 (Internal Server Error)
+    assert response.status_code == 500, f"Expected status code 500, got {response.status_code}"
+
+    # Assert that the error body uses the app's JSON error shape
+    assert response.json() == {'error': 'Internal Server Error'}, f"Unexpected body {response.text}"
+
+# ---------------------------------------------
+# Test Function: test_read_root_without_lifespan
+# ---------------------------------------------
+
+def test_read_root_without_lifespan():
+    """
+    Test the Root Page Without Running the Lifespan.
+
+    This test verifies that `/` renders even when the TestClient is not used as a
+    context manager, i.e. without the application's startup/shutdown running.
+
+    Steps:
+    1. Send a GET request to `/` from a TestClient created outside a `with` block.
+    2. Assert that the response status code is `200 OK` and the body is HTML.
+    """
+    response = TestClient(app).get('/')
+
+    # Assert that the response status code is 200 (OK)
+    assert response.status_code == 200, f"Expected status code 200, got {response.status_code}"
+
+    # Assert that the template was rendered as HTML
+    assert response.headers['content-type'].startswith('text/html')
@@ -1,15 +1,31 @@
 # tests/integration/test_user_auth.py
 
+import asyncio
+import time
+import uuid
 import pytest
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock
 from uuid import UUID
 import pydantic_core
 from sqlalchemy.exc import IntegrityError
-from app.models.user import User
+from app.auth.hashing import BCRYPT_ROUNDS
+from app.auth.tokens import decode_token, encode_token
+from app.models.user import User, _decode_token, _pending_logins, flush_last_logins, record_login
+from app.schemas.user import UserCreate
 
-def test_password_hashing(db_session, fake_user_data):
+@pytest.fixture(autouse=True)
+def clear_pending_logins():
+    """Keep queued last_login updates from leaking between tests"""
+    _pending_logins.clear()
+    yield
+    _pending_logins.clear()
+
+@pytest.mark.asyncio
+async def test_password_hashing(db_session, fake_user_data):
     """Test password hashing and verification functionality"""
     original_password = "TestPass123"  # Use known password for test
-    hashed = User.hash_password(original_password)
+    hashed = await User.hash_password(original_password)
     
     user = User(
         first_name=fake_user_data['first_name'],
@@ -19,16 +35,23 @@ def test_password_hashing(db_session, fake_user_data):
         password=hashed
     )
     
-    assert user.verify_password(original_password) is True
-    assert user.verify_password("WrongPass123") is False
+    assert await user.verify_password(original_password) is True
+    assert await user.verify_password("WrongPass123") is False
     assert hashed != original_password
 
-def test_user_registration(db_session, fake_user_data):
+@pytest.mark.asyncio
+async def test_password_hashing_uses_configured_rounds():
+    """Test that hashes are generated with the BCRYPT_ROUNDS cost factor"""
+    hashed = await User.hash_password("TestPass123")
+    assert hashed.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+
+@pytest.mark.asyncio
+async def test_user_registration(async_db_session, fake_user_data):
     """Test user registration process"""
     fake_user_data['password'] = "TestPass123"
     
-    user = User.register(db_session, fake_user_data)
-    db_session.commit()
+    user = await User.register(async_db_session, UserCreate(**fake_user_data))
+    await async_db_session.commit()
     
     assert user.first_name == fake_user_data['first_name']
     assert user.last_name == fake_user_data['last_name']
@@ -36,9 +59,10 @@ def test_user_registration(db_session, fake_user_data):
     assert user.username == fake_user_data['username']
     assert user.is_active is True
     assert user.is_verified is False
-    assert user.verify_password("TestPass123") is True
+    assert await user.verify_password("TestPass123") is True
 
-def test_duplicate_user_registration(db_session):
+@pytest.mark.asyncio
+async def test_duplicate_user_registration(async_db_session):
     """Test registration with duplicate email/username"""
     # First user data
     user1_data = {
@@ -59,24 +83,25 @@ def test_duplicate_user_registration(db_session):
     }
     
     # Register first user
-    first_user = User.register(db_session, user1_data)
-    db_session.commit()
-    db_session.refresh(first_user)
+    first_user = await User.register(async_db_session, UserCreate(**user1_data))
+    await async_db_session.commit()
+    await async_db_session.refresh(first_user)
     
     # Try to register second user with same email
     with pytest.raises(ValueError, match="Username or email already exists"):
-        User.register(db_session, user2_data)
+        await User.register(async_db_session, UserCreate(**user2_data))
 
-def test_user_authentication(db_session, fake_user_data):
+@pytest.mark.asyncio
+async def test_user_authentication(async_db_session, fake_user_data):
     """Test user authentication and token generation"""
     # Use fake_user_data from fixture
     fake_user_data['password'] = "TestPass123"
-    user = User.register(db_session, fake_user_data)
-    db_session.commit()
+    user = await User.register(async_db_session, UserCreate(**fake_user_data))
+    await async_db_session.commit()
     
     # Test successful authentication
-    auth_result = User.authenticate(
-        db_session,
+    auth_result = await User.authenticate(
+        async_db_session,
         fake_user_data['username'],
         "TestPass123"
     )
@@ -87,19 +112,41 @@ def test_user_authentication(db_session, fake_user_data):
     assert auth_result["token_type"] == "bearer"
     assert "user" in auth_result
 
-def test_user_last_login_update(db_session, fake_user_data):
-    """Test that last_login is updated on authentication"""
+@pytest.mark.asyncio
+async def test_cancelled_last_login_flush_requeues():
+    """Test that a flush cancelled mid-write puts its batch back on the queue"""
+    user_id = uuid.uuid4()
+    record_login(user_id)
+    db = MagicMock()
+    db.execute = AsyncMock(side_effect=asyncio.CancelledError)
+    db.rollback = AsyncMock()
+
+    with pytest.raises(asyncio.CancelledError):
+        await flush_last_logins(db)
+    assert [queued_id for queued_id, _ in _pending_logins] == [user_id]
+    db.rollback.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_user_last_login_update(async_db_session, fake_user_data):
+    """Test that last_login is updated once queued logins are flushed"""
     fake_user_data['password'] = "TestPass123"
-    user = User.register(db_session, fake_user_data)
-    db_session.commit()
+    user = await User.register(async_db_session, UserCreate(**fake_user_data))
+    await async_db_session.commit()
     
-    # Authenticate and check last_login
+    # Authenticate only queues the update; the flush writes it
+    assert user.last_login is None
+    auth_result = await User.authenticate(async_db_session, fake_user_data['username'], "TestPass123")
+    await async_db_session.refresh(user)
     assert user.last_login is None
-    auth_result = User.authenticate(db_session, fake_user_data['username'], "TestPass123")
-    db_session.refresh(user)
+
+    assert await flush_last_logins(async_db_session) == 1
+    await async_db_session.refresh(user)
     assert user.last_login is not None
+    assert user.last_login.tzinfo is not None
+    assert await flush_last_logins(async_db_session) == 0
 
-def test_unique_email_username(db_session):
+@pytest.mark.asyncio
+async def test_unique_email_username(async_db_session):
     """Test uniqueness constraints for email and username"""
     # Create first user with specific test data
     user1_data = {
@@ -111,8 +158,8 @@ def test_unique_email_username(db_session):
     }
     
     # Register and commit first user
-    User.register(db_session, user1_data)
-    db_session.commit()
+    await User.register(async_db_session, UserCreate(**user1_data))
+    await async_db_session.commit()
     
     # Try to create user with same email
     user2_data = {
@@ -124,9 +171,10 @@ def test_unique_email_username(db_session):
     }
     
     with pytest.raises(ValueError, match="Username or email already exists"):
-        User.register(db_session, user2_data)
+        await User.register(async_db_session, UserCreate(**user2_data))
 
-def test_short_password_registration(db_session):
+@pytest.mark.asyncio
+async def test_short_password_registration(async_db_session):
     """Test that registration fails with a short password"""
     # Prepare test data with a 5-character password
     test_data = {
@@ -139,7 +187,7 @@ def test_short_password_registration(db_session):
     
     # Attempt registration with short password
     with pytest.raises(ValueError, match="Password must be at least 6 characters long"):
-        User.register(db_session, test_data)
+        await User.register(async_db_session, UserCreate(**test_data))
 
 def test_invalid_token():
     """Test that invalid tokens are rejected"""
@@ -147,11 +195,12 @@ def test_invalid_token():
     result = User.verify_token(invalid_token)
     assert result is None
 
-def test_token_creation_and_verification(db_session, fake_user_data):
+@pytest.mark.asyncio
+async def test_token_creation_and_verification(async_db_session, fake_user_data):
     """Test token creation and verification"""
     fake_user_data['password'] = "TestPass123"
-    user = User.register(db_session, fake_user_data)
-    db_session.commit()
+    user = await User.register(async_db_session, UserCreate(**fake_user_data))
+    await async_db_session.commit()
     
     # Create token
     token = User.create_access_token({"sub": str(user.id)})
@@ -160,15 +209,77 @@ def test_token_creation_and_verification(db_session, fake_user_data):
     decoded_user_id = User.verify_token(token)
     assert decoded_user_id == user.id
 
-def test_authenticate_with_email(db_session, fake_user_data):
+def test_tampered_token_rejected():
+    """Test that a token whose payload or signature was altered is rejected"""
+    token = User.create_access_token({"sub": "tamperuser"})
+    header, payload, signature = token.split(".")
+    forged_payload = User.create_access_token({"sub": "admin"}).split(".")[1]
+
+    assert User.verify_token(token) == "tamperuser"
+    assert User.verify_token(f"{header}.{forged_payload}.{signature}") is None
+    flipped = ("B" if signature[0] == "A" else "A") + signature[1:]
+    assert User.verify_token(f"{header}.{payload}.{flipped}") is None
+
+def test_malformed_signature_rejected():
+    """Test that signatures which aren't a base64url HMAC-SHA256 digest are rejected"""
+    header, payload, signature = User.create_access_token({"sub": "siguser"}).split(".")
+
+    assert User.verify_token(f"{header}.{payload}.{signature[:-1]}") is None
+    assert User.verify_token(f"{header}.{payload}.{signature}A") is None
+    assert User.verify_token(f"{header}.{payload}.{'!' * len(signature)}") is None
+
+def test_malformed_token_short_circuits(monkeypatch):
+    """Test that structurally invalid tokens are rejected before decoding"""
+    token = User.create_access_token({"sub": "shapeuser"})
+    header, payload, signature = token.split(".")
+
+    def fail_decode(_token):
+        raise AssertionError("malformed tokens should not reach the decoder")
+
+    monkeypatch.setattr("app.models.user._decode_token", fail_decode)
+    assert User.verify_token("not-a-jwt") is None
+    assert User.verify_token(f"{token}.extra") is None
+    assert User.verify_token(f"{header}.{payload}.{'A' * 5000}") is None
+    assert User.verify_token(f"eyJhbGciOiJub25lIn0.{payload}.{signature}") is None
+
+def test_token_time_claims_validated():
+    """Test that nbf in the future and non-numeric iat/nbf are rejected"""
+    now = int(time.time())
+    assert decode_token(encode_token({"sub": "u", "iat": now, "nbf": now})) is not None
+    assert decode_token(encode_token({"sub": "u", "nbf": now + 60})) is None
+    assert decode_token(encode_token({"sub": "u", "nbf": "now"})) is None
+    assert decode_token(encode_token({"sub": "u", "iat": "yesterday"})) is None
+    assert decode_token(encode_token({"sub": "u", "iat": True})) is None
+
+def test_forged_tokens_not_cached():
+    """Test that tokens failing verification don't take slots in the token cache"""
+    header, payload, signature = User.create_access_token({"sub": "forgeduser"}).split(".")
+    flipped = ("B" if signature[0] == "A" else "A") + signature[1:]
+    cached_before = _decode_token.cache_info().currsize
+
+    assert User.verify_token(f"{header}.{payload}.{flipped}") is None
+    assert _decode_token.cache_info().currsize == cached_before
+
+def test_cached_token_rejected_after_expiry(monkeypatch):
+    """Test that a cached token verification stops being honoured once exp passes"""
+    token = User.create_access_token({"sub": "cacheduser"}, expires_delta=timedelta(minutes=5))
+    assert User.verify_token(token) == "cacheduser"
+    assert User.verify_token(token) == "cacheduser"  # served from the cache
+
+    future = time.time() + 10 * 60
+    monkeypatch.setattr("app.models.user.time.time", lambda: future)
+    assert User.verify_token(token) is None
+
+@pytest.mark.asyncio
+async def test_authenticate_with_email(async_db_session, fake_user_data):
     """Test authentication using email instead of username"""
     fake_user_data['password'] = "TestPass123"
-    user = User.register(db_session, fake_user_data)
-    db_session.commit()
+    user = await User.register(async_db_session, UserCreate(**fake_user_data))
+    await async_db_session.commit()
     
     # Test authentication with email
-    auth_result = User.authenticate(
-        db_session,
+    auth_result = await User.authenticate(
+        async_db_session,
         fake_user_data['email'],  # Using email instead of username
         "TestPass123"
     )
@@ -181,7 +292,8 @@ def test_user_model_representation(test_user):
     expected = f"<User(name={test_user.first_name} {test_user.last_name}, email={test_user.email})>"
     assert str(test_user) == expected
 
-def test_missing_password_registration(db_session):
+@pytest.mark.asyncio
+async def test_missing_password_registration(async_db_session):
     """Test that registration fails when no password is provided."""
     test_data = {
         "first_name": "NoPassword",
@@ -191,6 +303,6 @@ def test_missing_password_registration(db_session):
         # Password is missing
     }
     
-    # Adjust the expected error message
-    with pytest.raises(ValueError, match="Password must be at least 6 characters long"):
-        User.register(db_session, test_data)
+    # The payload is rejected by UserCreate before register is reached
+    with pytest.raises(ValueError, match="password"):
+        await User.register(async_db_session, UserCreate(**test_data))